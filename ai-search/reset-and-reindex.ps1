@@ -6,6 +6,7 @@ param(
     [string]$SearchServiceName = "srch-jurisimple-dev-001",
     [string]$IndexName = "vector-jt-poc",
     [string]$IndexerName = "vector-jt-poc-indexer",
+    [string]$SearchAdminKey = $env:AZURE_SEARCH_ADMIN_KEY,
     [switch]$SkipConfirmation
 )
 
@@ -14,12 +15,16 @@ $ErrorActionPreference = "Stop"
 Write-Host "=== AI Search Index Reset and Reindex Script ===" -ForegroundColor Cyan
 Write-Host ""
 
-# Get Search Service admin key
-Write-Host "Getting Search Service admin key..." -ForegroundColor Yellow
-$adminKey = az search admin-key show `
-    --resource-group $ResourceGroup `
-    --service-name $SearchServiceName `
-    --query "primaryKey" -o tsv
+# Get Search Service admin key (a key passed in or set in AZURE_SEARCH_ADMIN_KEY skips the az CLI start-up)
+$adminKey = $SearchAdminKey
+if (-not $adminKey) {
+    Write-Host "Getting Search Service admin key..." -ForegroundColor Yellow
+    $adminKey = az search admin-key show `
+        --resource-group $ResourceGroup `
+        --service-name $SearchServiceName `
+        --query "primaryKey" -o tsv `
+        --only-show-errors
+}
 
 if (-not $adminKey) {
     Write-Error "Failed to get admin key. Make sure you're logged into Azure CLI."
@@ -39,12 +39,13 @@ public sealed class SyncFunction
         }
 
         _logger.LogInformation(
-            "Scheduled SharePoint sync starting. site={Site}, drive={Drive}, folder={Folder}, container={Container}, syncPermissions={SyncPermissions}",
+            "Scheduled SharePoint sync starting. site={Site}, drive={Drive}, folder={Folder}, container={Container}, syncPermissions={SyncPermissions}, phase={Phase}",
             options.SharePointSiteUrl,
             options.SharePointDriveName,
             options.SharePointFolderPath,
             options.ContainerName,
-            options.SyncPermissions);
+            options.SyncPermissions,
+            options.SyncPhase);
 
         await SyncLock.WaitAsync(cancellationToken);
         try
@@ -0,0 +1,11 @@
+using System.Text.Json.Serialization;
+
+namespace SharePointSync.Functions.Models;
+
+// Source-generated serializers for the payloads written on every sync, so no reflection metadata is built at runtime.
+// Null email/id fields are omitted: blob metadata is capped at 8 KB per blob, shared with the ACL id lists.
+[JsonSourceGenerationOptions(DefaultIgnoreCondition = JsonIgnoreCondition.WhenWritingNull)]
+[JsonSerializable(typeof(List<SharePointPermission>))]
+internal sealed partial class SyncJsonContext : JsonSerializerContext
+{
+}
@@ -1,3 +1,7 @@
+using System.Collections.ObjectModel;
+using System.Diagnostics.CodeAnalysis;
+using System.Security.Cryptography;
+using System.Text;
 using System.Text.Json;
 
 namespace SharePointSync.Functions.Models;
@@ -14,6 +18,7 @@ public sealed class SyncStats
     public long BytesTransferred { get; set; }
     public int PermissionsSynced { get; set; }
     public int PermissionsFailed { get; set; }
+    public int PermissionsSkipped { get; set; }
     public string SyncMode { get; set; } = "full";
 }
 
@@ -25,6 +30,7 @@ public sealed class SharePointFile
     public long Size { get; init; }
     public DateTimeOffset? LastModified { get; init; }
     public string? ContentHash { get; init; }
+    public string? DownloadUrl { get; init; }
 }
 
 public enum DeltaChangeType
@@ -43,6 +49,12 @@ public sealed class DeltaChange
     public bool IsFolder { get; init; }
 }
 
+public sealed class DeltaPage
+{
+    public List<DeltaChange> Changes { get; init; } = [];
+    public string? DeltaToken { get; init; }
+}
+
 public sealed class DeltaResult
 {
     public List<DeltaChange> Changes { get; init; } = [];
@@ -55,39 +67,74 @@ public sealed class BlobFile
     public required string Name { get; init; }
     public long Size { get; init; }
     public DateTimeOffset LastModified { get; init; }
-    public IDictionary<string, string> Metadata { get; init; } = new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase);
+    public IDictionary<string, string> Metadata { get; init; } = EmptyMetadata;
+    public DateTimeOffset? SharePointLastModified { get; init; }
+
+    // Shared by every listing entry without metadata, so no per-blob dictionary is allocated.
+    public static readonly IDictionary<string, string> EmptyMetadata = ReadOnlyDictionary<string, string>.Empty;
 }
 
 public sealed class FilePermissions
 {
+    public const string MetadataPermissionsHash = "permissions_hash";
+
+    // Every blob metadata key written by ToMetadata.
+    public static readonly string[] MetadataKeys =
+    [
+        "sharepoint_permissions",
+        "permissions_synced_at",
+        "user_ids",
+        "group_ids",
+        MetadataPermissionsHash
+    ];
+
     public required string FileId { get; init; }
     public required string FilePath { get; init; }
     public required List<SharePointPermission> Permissions { get; init; }
 
-    public IDictionary<string, string> ToMetadata()
+    public IDictionary<string, string> ToMetadata(string? syncedAt = null)
     {
-        var users = Permissions
-            .Where(p => p.IdentityType == "user" && IsGuid(p.IdentityId))
-            .Select(p => p.IdentityId!)
-            .Distinct(StringComparer.OrdinalIgnoreCase)
-            .ToArray();
-
-        var groups = Permissions
-            .Where(p => p.IdentityType == "group" && IsGuid(p.IdentityId))
-            .Select(p => p.IdentityId!)
-            .Distinct(StringComparer.OrdinalIgnoreCase)
-            .ToArray();
+        var users = new HashSet<string>(StringComparer.OrdinalIgnoreCase);
+        var groups = new HashSet<string>(StringComparer.OrdinalIgnoreCase);
+        foreach (var permission in Permissions)
+        {
+            var target = permission.IdentityType switch
+            {
+                "user" => users,
+                "group" => groups,
+                _ => null
+            };
+
+            if (target is not null && IsGuid(permission.IdentityId))
+            {
+                target.Add(permission.IdentityId);
+            }
+        }
 
+        // Sorted so the same ACL always produces the same metadata value, whatever order Graph lists it in.
         return new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase)
         {
-            ["sharepoint_permissions"] = JsonSerializer.Serialize(Permissions),
-            ["permissions_synced_at"] = DateTimeOffset.UtcNow.ToString("O"),
-            ["user_ids"] = users.Length == 0 ? "00000000-0000-0000-0000-000000000000" : string.Join("|", users),
-            ["group_ids"] = groups.Length == 0 ? "00000000-0000-0000-0000-000000000001" : string.Join("|", groups)
+            ["sharepoint_permissions"] = JsonSerializer.Serialize(Permissions, SyncJsonContext.Default.ListSharePointPermission),
+            ["permissions_synced_at"] = syncedAt ?? DateTimeOffset.UtcNow.ToString("O"),
+            ["user_ids"] = users.Count == 0 ? "00000000-0000-0000-0000-000000000000" : string.Join("|", users.Order(StringComparer.OrdinalIgnoreCase)),
+            ["group_ids"] = groups.Count == 0 ? "00000000-0000-0000-0000-000000000001" : string.Join("|", groups.Order(StringComparer.OrdinalIgnoreCase)),
+            [MetadataPermissionsHash] = ComputeHash()
         };
     }
 
-    private static bool IsGuid(string? value) => Guid.TryParse(value, out _);
+    // Stable across runs and Graph response ordering: one sorted line per grant, roles sorted within it.
+    public string ComputeHash()
+    {
+        var grants = Permissions
+            .Select(p => $"{p.IdentityType}:{p.IdentityId}:{string.Join(',', p.Roles.Order(StringComparer.Ordinal))}")
+            .Order(StringComparer.Ordinal);
+
+        var digest = SHA256.HashData(Encoding.UTF8.GetBytes(string.Join('\n', grants)));
+        return Convert.ToHexString(digest, 0, 8).ToLowerInvariant();
+    }
+
+    // Graph identity ids are always hyphenated; the exact "D" parse skips format detection.
+    private static bool IsGuid([NotNullWhen(true)] string? value) => Guid.TryParseExact(value, "D", out _);
 }
 
 public sealed class SharePointPermission
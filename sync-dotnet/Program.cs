@@ -1,3 +1,4 @@
+using System.Net;
 using Azure.Core;
 using Microsoft.Azure.Functions.Worker;
 using Microsoft.Extensions.Configuration;
@@ -37,6 +38,19 @@ var host = new HostBuilder()
         // Azure SDK clients
         services.AddHttpClient();
 
+        // Graph negotiates HTTP/2, so concurrent downloads and listings multiplex over a few connections.
+        // A short connect timeout fails a stuck handshake fast instead of holding it for the whole request timeout.
+        // Listing, delta and $batch pages are large, highly compressible JSON, so accept gzip/brotli, and keep
+        // idle connections long enough to bridge the gap between the content and permissions passes.
+        services.AddHttpClient(SharePointGraphClient.HttpClientName)
+            .ConfigurePrimaryHttpMessageHandler(() => new SocketsHttpHandler
+            {
+                EnableMultipleHttp2Connections = true,
+                ConnectTimeout = TimeSpan.FromSeconds(10),
+                PooledConnectionIdleTimeout = TimeSpan.FromMinutes(2),
+                AutomaticDecompression = DecompressionMethods.GZip | DecompressionMethods.Brotli
+            });
+
         services.AddSingleton<TokenCredentialFactory>();
         services.AddSingleton<TokenCredential>(sp =>
             sp.GetRequiredService<TokenCredentialFactory>().Create());
@@ -1,8 +1,13 @@
+using System.Collections.Concurrent;
+using System.Globalization;
 using System.Text.Json;
 using Azure;
 using Azure.Core;
+using Azure.Core.Pipeline;
+using Azure.Storage;
 using Azure.Storage.Blobs;
 using Azure.Storage.Blobs.Models;
+using Azure.Storage.Blobs.Specialized;
 using Microsoft.Extensions.Logging;
 using SharePointSync.Functions.Models;
 
@@ -15,9 +20,40 @@ public sealed class BlobStorageSyncClient
     public const string MetadataSpLastModified = "sharepoint_last_modified";
     public const string MetadataSpContentHash = "sharepoint_content_hash";
 
+    // Blob Batch API limit on sub-requests per call.
+    private const int MaxBatchSize = 256;
+    private const int MaxConcurrentBatches = 4;
+    private const int MaxConcurrentDeletes = 32;
+
+    // Graph download streams are not seekable, so the SDK buffers up to InitialTransferSize before
+    // choosing between a single Put Blob and staged blocks. Keeping both sizes small bounds per-file
+    // memory to MaximumTransferSize * MaximumConcurrency regardless of file size.
+    private static readonly StorageTransferOptions UploadTransferOptions = new()
+    {
+        InitialTransferSize = 4 * 1024 * 1024,
+        MaximumTransferSize = 4 * 1024 * 1024,
+        MaximumConcurrency = 4
+    };
+
+    // Legacy ACL keys from earlier sync versions, stripped whenever permissions are rewritten.
+    private static readonly string[] DeprecatedMetadataKeys =
+    [
+        "metadata_user_ids",
+        "metadata_group_ids",
+        "acl_user_ids_list",
+        "acl_group_ids_list",
+        "metadata_acl_user_ids",
+        "metdata_acl_group_ids",
+        "sharepoint_etag"
+    ];
+
+    // Azure SDK clients are thread-safe; sharing one per account keeps its connection pool warm across timer runs.
+    private static readonly ConcurrentDictionary<string, BlobServiceClient> ServiceClients = new(StringComparer.OrdinalIgnoreCase);
+
     private readonly ILogger<BlobStorageSyncClient> _logger;
     private BlobContainerClient? _containerClient;
     private string _blobPrefix = string.Empty;
+    private string _blobNamePrefix = string.Empty;
 
     public BlobStorageSyncClient(ILogger<BlobStorageSyncClient> logger)
     {
@@ -31,9 +67,10 @@ public sealed class BlobStorageSyncClient
             _logger.LogInformation("Initializing Blob Storage client for account: {AccountUrl}, container: {Container}", 
                 options.BlobAccountUrl, options.ContainerName);
 
-            var service = new BlobServiceClient(new Uri(options.BlobAccountUrl), credential);
+            var service = ServiceClients.GetOrAdd(options.BlobAccountUrl, url => CreateServiceClient(url, credential));
             _containerClient = service.GetBlobContainerClient(options.ContainerName);
             _blobPrefix = options.BlobPrefix.Trim('/');
+            _blobNamePrefix = string.IsNullOrWhiteSpace(_blobPrefix) ? string.Empty : _blobPrefix + "/";
 
             await _containerClient.CreateIfNotExistsAsync(cancellationToken: cancellationToken);
 
@@ -48,8 +85,9 @@ public sealed class BlobStorageSyncClient
 
     public string GetBlobName(string sharePointPath)
     {
-        var clean = sharePointPath.TrimStart('/');
-        return string.IsNullOrWhiteSpace(_blobPrefix) ? clean : $"{_blobPrefix}/{clean}";
+        return _blobNamePrefix.Length == 0
+            ? sharePointPath.TrimStart('/')
+            : string.Concat(_blobNamePrefix, sharePointPath.AsSpan().TrimStart('/'));
     }
 
     public async Task<IReadOnlyDictionary<string, BlobFile>> ListBlobsAsync(CancellationToken cancellationToken)
@@ -58,25 +96,42 @@ public sealed class BlobStorageSyncClient
         var result = new Dictionary<string, BlobFile>(StringComparer.OrdinalIgnoreCase);
         var prefix = string.IsNullOrWhiteSpace(_blobPrefix) ? null : _blobPrefix;
 
-        await foreach (var blob in _containerClient!.GetBlobsAsync(traits: BlobTraits.Metadata, states: BlobStates.All, prefix: prefix, cancellationToken: cancellationToken))
+        await using var pages = _containerClient!
+            .GetBlobsAsync(traits: BlobTraits.Metadata, states: BlobStates.All, prefix: prefix, cancellationToken: cancellationToken)
+            .AsPages()
+            .GetAsyncEnumerator(cancellationToken);
+
+        var nextPage = pages.MoveNextAsync();
+        while (await nextPage)
         {
-            if (blob.Name.EndsWith('/'))
-            {
-                continue;
-            }
+            var page = pages.Current;
 
-            if (blob.Properties.ContentLength == 0 && !blob.Name.Split('/').Last().Contains('.'))
-            {
-                continue;
-            }
+            // Request the following page before processing this one so the listing round-trip overlaps the loop below.
+            nextPage = pages.MoveNextAsync();
 
-            result[blob.Name] = new BlobFile
+            foreach (var blob in page.Values)
             {
-                Name = blob.Name,
-                Size = blob.Properties.ContentLength ?? 0,
-                LastModified = blob.Properties.LastModified ?? DateTimeOffset.UtcNow,
-                Metadata = blob.Metadata ?? new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase)
-            };
+                if (blob.Name.EndsWith('/'))
+                {
+                    continue;
+                }
+
+                // Zero-length entries without an extension in their last segment are directory markers.
+                if (blob.Properties.ContentLength == 0 && blob.Name.IndexOf('.', blob.Name.LastIndexOf('/') + 1) < 0)
+                {
+                    continue;
+                }
+
+                var metadata = blob.Metadata ?? BlobFile.EmptyMetadata;
+                result[blob.Name] = new BlobFile
+                {
+                    Name = blob.Name,
+                    Size = blob.Properties.ContentLength ?? 0,
+                    LastModified = blob.Properties.LastModified ?? DateTimeOffset.UtcNow,
+                    Metadata = metadata,
+                    SharePointLastModified = ParseStoredLastModified(metadata)
+                };
+            }
         }
 
         return result;
@@ -84,10 +139,11 @@ public sealed class BlobStorageSyncClient
 
     public async Task UploadBlobAsync(
         string sharePointPath,
-        byte[] content,
+        Stream content,
         string sharePointItemId,
         DateTimeOffset? sharePointLastModified,
         string? sharePointContentHash,
+        IDictionary<string, string>? additionalMetadata,
         CancellationToken cancellationToken)
     {
         EnsureInitialized();
@@ -105,25 +161,35 @@ public sealed class BlobStorageSyncClient
             metadata[MetadataSpContentHash] = sharePointContentHash;
         }
 
-        await blob.UploadAsync(BinaryData.FromBytes(content), new BlobUploadOptions
+        if (additionalMetadata is not null)
         {
-            Metadata = metadata
+            foreach (var (key, value) in additionalMetadata)
+            {
+                metadata[key] = value;
+            }
+        }
+
+        await blob.UploadAsync(content, new BlobUploadOptions
+        {
+            Metadata = metadata,
+            TransferOptions = UploadTransferOptions
         }, cancellationToken);
     }
 
     public bool ShouldUpdate(BlobFile existingBlob, DateTimeOffset? sharePointLastModified, string? sharePointContentHash)
     {
-        if (existingBlob.Metadata is null)
+        if (existingBlob.Metadata is null || existingBlob.Metadata.Count == 0)
         {
             return true;
         }
 
         if (existingBlob.Metadata.TryGetValue(MetadataSpContentHash, out var storedHash) &&
             !string.IsNullOrWhiteSpace(storedHash) &&
-            !string.IsNullOrWhiteSpace(sharePointContentHash) &&
-            !string.Equals(storedHash, sharePointContentHash, StringComparison.OrdinalIgnoreCase))
+            !string.IsNullOrWhiteSpace(sharePointContentHash))
         {
-            return true;
+            // The stored value is the item's cTag (or eTag), which only changes with content,
+            // so a match means the blob is current whatever the timestamps say.
+            return !string.Equals(storedHash, sharePointContentHash, StringComparison.OrdinalIgnoreCase);
         }
 
         if (sharePointLastModified is null)
@@ -131,10 +197,9 @@ public sealed class BlobStorageSyncClient
             return true;
         }
 
-        if (existingBlob.Metadata.TryGetValue(MetadataSpLastModified, out var storedDate) &&
-            DateTimeOffset.TryParse(storedDate, out var parsedStoredDate))
+        if (existingBlob.SharePointLastModified is { } storedDate)
         {
-            return sharePointLastModified > parsedStoredDate;
+            return sharePointLastModified.Value.UtcTicks > storedDate.UtcTicks;
         }
 
         return true;
@@ -154,6 +219,35 @@ public sealed class BlobStorageSyncClient
         }
     }
 
+    public async Task<int> DeleteBlobsAsync(IReadOnlyCollection<string> blobNames, CancellationToken cancellationToken)
+    {
+        EnsureInitialized();
+        var batchClient = _containerClient!.GetBlobBatchClient();
+        var failed = 0;
+
+        await Parallel.ForEachAsync(
+            blobNames.Chunk(MaxBatchSize),
+            new ParallelOptions { MaxDegreeOfParallelism = MaxConcurrentBatches, CancellationToken = cancellationToken },
+            async (batch, token) =>
+            {
+                try
+                {
+                    await DeleteBatchAsync(batchClient, batch, token);
+                }
+                catch (AggregateException ex)
+                {
+                    Interlocked.Add(ref failed, ex.InnerExceptions.Count);
+                }
+                catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
+                {
+                    _logger.LogError(ex, "Failed to delete a batch of {Count} blobs", batch.Length);
+                    Interlocked.Add(ref failed, batch.Length);
+                }
+            });
+
+        return failed;
+    }
+
     public async Task UpdateBlobMetadataAsync(string blobName, IDictionary<string, string> additionalMetadata, CancellationToken cancellationToken)
     {
         EnsureInitialized();
@@ -170,9 +264,12 @@ public sealed class BlobStorageSyncClient
             currentMetadata = new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase);
         }
 
-        foreach (var key in new[] { "metadata_user_ids", "metadata_group_ids", "acl_user_ids_list", "acl_group_ids_list", "metadata_acl_user_ids", "metdata_acl_group_ids" })
+        if (currentMetadata.Count > 0)
         {
-            currentMetadata.Remove(key);
+            foreach (var key in DeprecatedMetadataKeys)
+            {
+                currentMetadata.Remove(key);
+            }
         }
 
         foreach (var (key, value) in additionalMetadata)
@@ -183,6 +280,33 @@ public sealed class BlobStorageSyncClient
         await blob.SetMetadataAsync(currentMetadata, cancellationToken: cancellationToken);
     }
 
+    public async Task<int> UpdateBlobMetadataBulkAsync(
+        IReadOnlyCollection<KeyValuePair<string, IDictionary<string, string>>> entries,
+        int maxConcurrency,
+        CancellationToken cancellationToken)
+    {
+        EnsureInitialized();
+        var failed = 0;
+
+        await Parallel.ForEachAsync(
+            entries,
+            new ParallelOptions { MaxDegreeOfParallelism = maxConcurrency, CancellationToken = cancellationToken },
+            async (entry, token) =>
+            {
+                try
+                {
+                    await UpdateBlobMetadataAsync(entry.Key, entry.Value, token);
+                }
+                catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
+                {
+                    _logger.LogError(ex, "Failed to update metadata for blob {Blob}", entry.Key);
+                    Interlocked.Increment(ref failed);
+                }
+            });
+
+        return failed;
+    }
+
     public async Task<string?> LoadDeltaTokenAsync(CancellationToken cancellationToken)
     {
         EnsureInitialized();
@@ -210,7 +334,7 @@ public sealed class BlobStorageSyncClient
             return;
         }
 
-        var payload = JsonSerializer.Serialize(new
+        var payload = JsonSerializer.SerializeToUtf8Bytes(new
         {
             delta_link = deltaToken,
             saved_at = DateTimeOffset.UtcNow.ToString("O")
@@ -218,20 +342,149 @@ public sealed class BlobStorageSyncClient
 
         await _containerClient!
             .GetBlobClient(DeltaTokenBlobName)
-            .UploadAsync(BinaryData.FromString(payload), overwrite: true, cancellationToken: cancellationToken);
+            .UploadAsync(BinaryData.FromBytes(payload), overwrite: true, cancellationToken: cancellationToken);
+    }
+
+    private static BlobServiceClient CreateServiceClient(string accountUrl, TokenCredential credential)
+    {
+        // Recycle pooled connections periodically so DNS changes are picked up, and keep idle sockets
+        // alive between the bursts of uploads and deletes instead of reconnecting for each one.
+        // A custom handler replaces Azure.Core's default one, so its cookie and redirect settings are
+        // restated: the pipeline does its own redirect handling and storage responses carry no cookies.
+        var handler = new SocketsHttpHandler
+        {
+            PooledConnectionLifetime = TimeSpan.FromMinutes(5),
+            PooledConnectionIdleTimeout = TimeSpan.FromSeconds(60),
+            UseCookies = false,
+            AllowAutoRedirect = false
+        };
+
+        return new BlobServiceClient(new Uri(accountUrl), credential, new BlobClientOptions
+        {
+            Transport = new HttpClientTransport(handler)
+        });
+    }
+
+    private static DateTimeOffset? ParseStoredLastModified(IDictionary<string, string> metadata)
+    {
+        if (!metadata.TryGetValue(MetadataSpLastModified, out var storedDate))
+        {
+            return null;
+        }
+
+        // Values are written with the round-trip "O" format, so the exact parser is the common path.
+        if (DateTimeOffset.TryParseExact(storedDate, "O", CultureInfo.InvariantCulture, DateTimeStyles.RoundtripKind, out var parsedStoredDate) ||
+            DateTimeOffset.TryParse(storedDate, CultureInfo.InvariantCulture, DateTimeStyles.AssumeUniversal, out parsedStoredDate))
+        {
+            return parsedStoredDate;
+        }
+
+        return null;
     }
 
     private async Task DeleteDirectoryRecursiveAsync(string directoryPath, CancellationToken cancellationToken)
     {
         var prefix = directoryPath.TrimEnd('/') + "/";
-        await foreach (var blob in _containerClient!.GetBlobsAsync(traits: BlobTraits.None, states: BlobStates.All, prefix: prefix, cancellationToken: cancellationToken))
+        var batchClient = _containerClient!.GetBlobBatchClient();
+        var pending = new List<string>(MaxBatchSize);
+        var inFlight = new List<Task>(MaxConcurrentBatches);
+
+        try
         {
-            await _containerClient.GetBlobClient(blob.Name).DeleteIfExistsAsync(cancellationToken: cancellationToken);
+            await foreach (var blob in _containerClient!.GetBlobsAsync(traits: BlobTraits.None, states: BlobStates.All, prefix: prefix, cancellationToken: cancellationToken))
+            {
+                pending.Add(blob.Name);
+                if (pending.Count < MaxBatchSize)
+                {
+                    continue;
+                }
+
+                if (inFlight.Count == MaxConcurrentBatches)
+                {
+                    var completed = await Task.WhenAny(inFlight);
+                    inFlight.Remove(completed);
+                    await completed;
+                }
+
+                inFlight.Add(DeleteBatchAsync(batchClient, pending, cancellationToken));
+                pending = new List<string>(MaxBatchSize);
+            }
+
+            if (pending.Count > 0)
+            {
+                inFlight.Add(DeleteBatchAsync(batchClient, pending, cancellationToken));
+            }
+
+            await Task.WhenAll(inFlight);
+        }
+        catch
+        {
+            // Let the other batches finish before surfacing the failure, so no delete outlives the
+            // call and their errors are logged rather than lost.
+            var remaining = Task.WhenAll(inFlight);
+            try
+            {
+                await remaining;
+            }
+            catch when (!cancellationToken.IsCancellationRequested)
+            {
+                _logger.LogError(remaining.Exception, "Other delete batches under {Prefix} also failed", prefix);
+            }
+            catch
+            {
+            }
+
+            throw;
         }
 
         await _containerClient.GetBlobClient(directoryPath).DeleteIfExistsAsync(cancellationToken: cancellationToken);
     }
 
+    private async Task DeleteBatchAsync(BlobBatchClient batchClient, IReadOnlyList<string> blobNames, CancellationToken cancellationToken)
+    {
+        var blobUris = blobNames.Select(name => _containerClient!.GetBlobClient(name).Uri).ToArray();
+
+        try
+        {
+            await batchClient.DeleteBlobsAsync(blobUris, cancellationToken: cancellationToken);
+        }
+        catch (AggregateException ex)
+        {
+            // Match DeleteIfExists semantics: blobs removed since the listing are not failures.
+            var failures = ex.InnerExceptions
+                .Where(inner => inner is not RequestFailedException { Status: 404 })
+                .ToArray();
+
+            // On HNS accounts a directory with children cannot be deleted in a batch, and the failures
+            // do not say which entry they belong to; retry the batch one blob at a time so DeleteBlobAsync
+            // can fall back to the recursive delete.
+            if (failures.Any(inner => inner is RequestFailedException { ErrorCode: "DirectoryIsNotEmpty" }))
+            {
+                _logger.LogWarning("Batch delete hit non-empty directories, deleting {Count} blobs individually", blobNames.Count);
+                await DeleteIndividuallyAsync(blobNames, cancellationToken);
+                return;
+            }
+
+            if (failures.Length > 0)
+            {
+                _logger.LogError("Batch delete failed for {Failed} of {Total} blobs", failures.Length, blobUris.Length);
+                throw new AggregateException(failures);
+            }
+        }
+        catch (RequestFailedException ex)
+        {
+            // The whole batch was rejected (e.g. unsupported on this account); fall back to one request per blob.
+            _logger.LogWarning(ex, "Batch delete rejected, deleting {Count} blobs individually", blobNames.Count);
+            await DeleteIndividuallyAsync(blobNames, cancellationToken);
+        }
+    }
+
+    private Task DeleteIndividuallyAsync(IReadOnlyList<string> blobNames, CancellationToken cancellationToken) =>
+        Parallel.ForEachAsync(
+            blobNames,
+            new ParallelOptions { MaxDegreeOfParallelism = MaxConcurrentDeletes, CancellationToken = cancellationToken },
+            async (name, token) => await DeleteBlobAsync(name, token));
+
     private void EnsureInitialized()
     {
         if (_containerClient is null)
@@ -1,4 +1,8 @@
+using System.Collections.Concurrent;
+using System.Globalization;
+using System.Net;
 using System.Net.Http.Headers;
+using System.Runtime.CompilerServices;
 using System.Text.Json;
 using Azure.Core;
 using Microsoft.Extensions.Logging;
@@ -8,18 +12,57 @@ namespace SharePointSync.Functions.Services;
 
 public sealed class SharePointGraphClient
 {
+    public const string HttpClientName = "graph";
+
+    private const string GraphBaseUrl = "https://graph.microsoft.com/v1.0";
+
+    // Only the driveItem properties the sync reads; Graph otherwise returns createdBy, fileSystemInfo, hashes, etc.
+    private const string ItemSelect = "id,name,size,file,folder,lastModifiedDateTime,cTag,eTag,@microsoft.graph.downloadUrl";
+    private const string DeltaItemSelect = ItemSelect + ",parentReference,deleted";
+
+    // The largest page Graph serves for drive children, so wide folders need fewer nextLink round trips.
+    private const string ChildrenQuery = "?$top=999&$select=" + ItemSelect;
+    private const string PermissionSelect = "id,roles,grantedToV2,inheritedFrom";
+
+    // Graph JSON batching accepts at most 20 sub-requests per call.
+    private const int MaxBatchRequests = 20;
+    private const int MaxConcurrentBatches = 4;
+    private const int MaxAttempts = 5;
+    private static readonly TimeSpan BaseRetryDelay = TimeSpan.FromMilliseconds(500);
+    private static readonly TimeSpan MaxRetryDelay = TimeSpan.FromSeconds(30);
+    private static readonly TimeSpan TokenRefreshMargin = TimeSpan.FromMinutes(5);
+
+    // grantedToV2 facets in precedence order, with the identity type each one is recorded as.
+    private static readonly (string Facet, string IdentityType)[] IdentityFacets =
+    [
+        ("user", "user"),
+        ("group", "group"),
+        ("siteGroup", "siteGroup"),
+        ("siteUser", "user")
+    ];
+
+    private static readonly TimeSpan ResolvedIdsLifetime = TimeSpan.FromHours(24);
+    private static readonly ConcurrentDictionary<(string SiteUrl, string DriveName), (string SiteId, string DriveId, DateTimeOffset ResolvedAt)> ResolvedIds = new();
+
     private static readonly JsonSerializerOptions JsonOptions = new() { PropertyNameCaseInsensitive = true };
-    private readonly IHttpClientFactory _httpClientFactory;
+    private readonly HttpClient _httpClient;
     private readonly TokenCredential _credential;
     private readonly ILogger<SharePointGraphClient> _logger;
     private readonly string[] _scopes = ["https://graph.microsoft.com/.default"];
 
     private string? _siteId;
     private string? _driveId;
+    private string? _drivePath;
+    private string? _driveUrl;
+    private string? _rootPathPrefix;
+    private (string SiteUrl, string DriveName)? _resolvedIdsKey;
+    private Task<AccessToken>? _tokenTask;
 
     public SharePointGraphClient(IHttpClientFactory httpClientFactory, TokenCredential credential, ILogger<SharePointGraphClient> logger)
     {
-        _httpClientFactory = httpClientFactory;
+        // One client per (scoped) instance: every page, batch and download of a run shares it,
+        // while the factory still rotates the pooled handler between runs.
+        _httpClient = httpClientFactory.CreateClient(HttpClientName);
         _credential = credential;
         _logger = logger;
     }
@@ -36,41 +79,26 @@ public sealed class SharePointGraphClient
 
     public async Task InitializeAsync(SyncOptions options, CancellationToken cancellationToken)
     {
-        var siteUri = new Uri(options.SharePointSiteUrl);
-        
-        // Construire correctement l'URL avec le path relatif sans le slash initial
-        var relativePath = siteUri.AbsolutePath.TrimStart('/');
-        var siteLookup = $"https://graph.microsoft.com/v1.0/sites/{siteUri.Host}:/{relativePath}";
-        
-        _logger.LogInformation("Resolving SharePoint site ID from: {SiteLookup}", siteLookup);
-        
-        var siteDoc = await GetJsonAsync(siteLookup, cancellationToken);
-        _siteId = siteDoc.RootElement.GetProperty("id").GetString();
-
-        if (string.IsNullOrWhiteSpace(_siteId))
+        // Site and drive IDs are effectively immutable, so the worker process resolves them once a day
+        // instead of on every timer run.
+        var cacheKey = (options.SharePointSiteUrl, options.SharePointDriveName.ToUpperInvariant());
+        _resolvedIdsKey = cacheKey;
+        if (ResolvedIds.TryGetValue(cacheKey, out var cached) && DateTimeOffset.UtcNow - cached.ResolvedAt < ResolvedIdsLifetime)
         {
-            throw new InvalidOperationException($"Unable to resolve site from {options.SharePointSiteUrl}");
+            _siteId = cached.SiteId;
+            _driveId = cached.DriveId;
+            _logger.LogInformation("Using cached SharePoint Site ID {SiteId} and Drive ID {DriveId}", _siteId, _driveId);
         }
-        
-        _logger.LogInformation("SharePoint Site ID resolved: {SiteId}", _siteId);
-
-        var drivesDoc = await GetJsonAsync($"https://graph.microsoft.com/v1.0/sites/{_siteId}/drives", cancellationToken);
-        foreach (var drive in drivesDoc.RootElement.GetProperty("value").EnumerateArray())
+        else
         {
-            var driveName = drive.GetProperty("name").GetString();
-            if (string.Equals(driveName, options.SharePointDriveName, StringComparison.OrdinalIgnoreCase))
-            {
-                _driveId = drive.GetProperty("id").GetString();
-                break;
-            }
+            await ResolveIdsAsync(options, cancellationToken);
+            ResolvedIds[cacheKey] = (_siteId!, _driveId!, DateTimeOffset.UtcNow);
         }
 
-        if (string.IsNullOrWhiteSpace(_driveId))
-        {
-            throw new InvalidOperationException($"Drive '{options.SharePointDriveName}' not found on site '{options.SharePointSiteUrl}'.");
-        }
-        
-        _logger.LogInformation("SharePoint Drive ID resolved: {DriveId} for drive '{DriveName}'", _driveId, options.SharePointDriveName);
+        // Every item request is rooted at the drive, so its path is formatted once per run.
+        _drivePath = $"/drives/{_driveId}";
+        _driveUrl = $"{GraphBaseUrl}{_drivePath}";
+        _rootPathPrefix = $"{_drivePath}/root:";
     }
 
     public async Task<IReadOnlyList<SharePointFile>> ListFilesAsync(string folderPath, CancellationToken cancellationToken)
@@ -78,158 +106,501 @@ public sealed class SharePointGraphClient
         EnsureInitialized();
         var files = new List<SharePointFile>();
         var normalized = string.IsNullOrWhiteSpace(folderPath) ? "/" : folderPath;
-
-        if (normalized == "/")
+        var rootUrl = normalized == "/"
+            ? $"{_drivePath}/root/children{ChildrenQuery}"
+            : $"{_drivePath}/root:/{Uri.EscapeDataString(normalized.Trim('/'))}:/children{ChildrenQuery}";
+
+        // Breadth-first: the folders of a level are listed concurrently, up to 20 per $batch call,
+        // and results are merged in level order so the file list comes out the same on every run.
+        var level = new List<(string Url, string Path)> { (rootUrl, normalized) };
+        var parallelOptions = new ParallelOptions { MaxDegreeOfParallelism = MaxConcurrentBatches, CancellationToken = cancellationToken };
+        try
         {
-            await ListChildrenRecursiveAsync($"https://graph.microsoft.com/v1.0/drives/{_driveId}/root/children?$top=200", "/", files, cancellationToken);
+            while (level.Count > 0)
+            {
+                var current = level;
+                var listings = new (List<SharePointFile> Files, List<(string Url, string Path)> Folders)[current.Count];
+                for (var i = 0; i < listings.Length; i++)
+                {
+                    listings[i] = (new List<SharePointFile>(), new List<(string Url, string Path)>());
+                }
+
+                var offsets = Enumerable
+                    .Range(0, (current.Count + MaxBatchRequests - 1) / MaxBatchRequests)
+                    .Select(batch => batch * MaxBatchRequests);
+                await Parallel.ForEachAsync(
+                    offsets,
+                    parallelOptions,
+                    (offset, token) => new ValueTask(
+                        ListChildrenBatchAsync(current, offset, Math.Min(MaxBatchRequests, current.Count - offset), listings, token)));
+
+                level = new List<(string Url, string Path)>();
+                foreach (var (folderFiles, subfolders) in listings)
+                {
+                    files.AddRange(folderFiles);
+                    level.AddRange(subfolders);
+                }
+            }
         }
-        else
+        catch when (!cancellationToken.IsCancellationRequested)
         {
-            var cleanPath = normalized.Trim('/');
-            await ListChildrenRecursiveAsync($"https://graph.microsoft.com/v1.0/drives/{_driveId}/root:/{Uri.EscapeDataString(cleanPath)}:/children?$top=200", normalized, files, cancellationToken);
+            // A cached drive ID that no longer resolves would otherwise fail every run until it ages out.
+            ForgetResolvedIds();
+            throw;
         }
 
         return files;
     }
 
-    public async Task<byte[]> DownloadFileAsync(string itemId, CancellationToken cancellationToken)
+    public async Task<Stream> OpenFileStreamAsync(SharePointFile file, CancellationToken cancellationToken)
     {
         EnsureInitialized();
-        using var request = await CreateRequestAsync(HttpMethod.Get, $"https://graph.microsoft.com/v1.0/drives/{_driveId}/items/{itemId}/content", cancellationToken);
-        using var client = _httpClientFactory.CreateClient();
-        using var response = await client.SendAsync(request, cancellationToken);
-        response.EnsureSuccessStatusCode();
-        return await response.Content.ReadAsByteArrayAsync(cancellationToken);
+
+        // Only the headers are buffered; the caller reads the body straight off the connection
+        // and releases it by disposing the returned stream.
+        if (!string.IsNullOrEmpty(file.DownloadUrl))
+        {
+            // The listing's pre-authenticated URL skips the Graph gateway (auth, redirect, throttling).
+            // It expires after about an hour, so a long run falls back to the /content endpoint.
+            using var request = new HttpRequestMessage(HttpMethod.Get, file.DownloadUrl)
+            {
+                Version = HttpVersion.Version20,
+                VersionPolicy = HttpVersionPolicy.RequestVersionOrLower
+            };
+            var direct = await _httpClient.SendAsync(request, HttpCompletionOption.ResponseHeadersRead, cancellationToken);
+            if (direct.IsSuccessStatusCode)
+            {
+                return await direct.Content.ReadAsStreamAsync(cancellationToken);
+            }
+
+            _logger.LogDebug("Download URL for {Path} returned {StatusCode}, falling back to Graph content", file.Path, (int)direct.StatusCode);
+            direct.Dispose();
+        }
+
+        var response = await SendWithRetryAsync(
+            HttpMethod.Get,
+            $"{_driveUrl}/items/{file.Id}/content",
+            null,
+            HttpCompletionOption.ResponseHeadersRead,
+            cancellationToken);
+        if (!response.IsSuccessStatusCode)
+        {
+            response.Dispose();
+            response.EnsureSuccessStatusCode();
+        }
+
+        return await response.Content.ReadAsStreamAsync(cancellationToken);
     }
 
     public async Task<DeltaResult> GetDeltaAsync(string? deltaLink, CancellationToken cancellationToken)
     {
-        EnsureInitialized();
-
-        var isInitial = string.IsNullOrWhiteSpace(deltaLink);
-        var nextUrl = isInitial
-            ? $"https://graph.microsoft.com/v1.0/drives/{_driveId}/root/delta"
-            : deltaLink!;
-
         var changes = new List<DeltaChange>();
         var deltaToken = string.Empty;
+        await foreach (var page in GetDeltaPagesAsync(deltaLink, cancellationToken))
+        {
+            changes.AddRange(page.Changes);
+            deltaToken = page.DeltaToken ?? deltaToken;
+        }
 
-        while (!string.IsNullOrWhiteSpace(nextUrl))
+        return new DeltaResult
         {
-            var document = await GetJsonAsync(nextUrl, cancellationToken);
+            Changes = changes,
+            DeltaToken = deltaToken,
+            IsInitialSync = string.IsNullOrWhiteSpace(deltaLink)
+        };
+    }
+
+    // Yields one page of file changes at a time so callers can persist as they go instead of holding
+    // the whole enumeration; only the terminal page carries the new delta token.
+    public async IAsyncEnumerable<DeltaPage> GetDeltaPagesAsync(string? deltaLink, [EnumeratorCancellation] CancellationToken cancellationToken)
+    {
+        EnsureInitialized();
+
+        var initialUrl = string.IsNullOrWhiteSpace(deltaLink)
+            ? $"{_driveUrl}/root/delta?$select={DeltaItemSelect}"
+            : deltaLink;
+
+        Task<JsonDocument>? pageTask = GetJsonAsync(initialUrl, cancellationToken);
 
-            if (document.RootElement.TryGetProperty("value", out var values))
+        try
+        {
+            while (pageTask is not null)
             {
-                foreach (var item in values.EnumerateArray())
+                using var document = await pageTask;
+
+                // Request the next page before parsing this one so its round-trip overlaps the parse.
+                pageTask = null;
+                string? deltaToken = null;
+                if (document.RootElement.TryGetProperty("@odata.nextLink", out var nextLinkNode))
+                {
+                    if (nextLinkNode.GetString() is { Length: > 0 } nextUrl)
+                    {
+                        pageTask = GetJsonAsync(nextUrl, cancellationToken);
+                    }
+                }
+                else if (document.RootElement.TryGetProperty("@odata.deltaLink", out var deltaLinkNode))
                 {
-                    var change = ParseDeltaItem(item);
-                    if (change is not null && !change.IsFolder)
+                    deltaToken = deltaLinkNode.GetString() ?? string.Empty;
+                }
+
+                var changes = new List<DeltaChange>();
+                if (document.RootElement.TryGetProperty("value", out var values))
+                {
+                    // Sized once per page (the array length is already known) instead of doubling as items are appended.
+                    changes.EnsureCapacity(values.GetArrayLength());
+                    foreach (var item in values.EnumerateArray())
                     {
-                        changes.Add(change);
+                        // Folder changes (deleted or not) are never returned, so skip them before any parsing.
+                        if (item.TryGetProperty("folder", out _))
+                        {
+                            continue;
+                        }
+
+                        var change = ParseDeltaItem(item);
+                        if (change is not null)
+                        {
+                            changes.Add(change);
+                        }
                     }
                 }
+
+                yield return new DeltaPage
+                {
+                    Changes = changes,
+                    DeltaToken = deltaToken
+                };
             }
+        }
+        finally
+        {
+            await ReleasePrefetchAsync(pageTask);
+        }
+    }
+
+    public async Task<FilePermissions> GetFilePermissionsAsync(string fileId, string filePath, CancellationToken cancellationToken)
+    {
+        EnsureInitialized();
+        using var document = await GetJsonAsync($"{_driveUrl}/items/{fileId}/permissions?$select={PermissionSelect}", cancellationToken);
+        return await ReadPermissionsAsync(document.RootElement, fileId, filePath, cancellationToken);
+    }
+
+    public async Task<IReadOnlyList<FilePermissions?>> GetFilePermissionsBatchAsync(IReadOnlyList<SharePointFile> files, CancellationToken cancellationToken)
+    {
+        EnsureInitialized();
+        var results = new FilePermissions?[files.Count];
+        var offsets = Enumerable
+            .Range(0, (files.Count + MaxBatchRequests - 1) / MaxBatchRequests)
+            .Select(batch => batch * MaxBatchRequests);
+
+        // Each batch fills its own slice of results, so the batches can run side by side.
+        await Parallel.ForEachAsync(
+            offsets,
+            new ParallelOptions { MaxDegreeOfParallelism = MaxConcurrentBatches, CancellationToken = cancellationToken },
+            async (offset, token) =>
+            {
+                var count = Math.Min(MaxBatchRequests, files.Count - offset);
+                try
+                {
+                    await FetchPermissionsBatchAsync(files, offset, count, results, token);
+                }
+                catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
+                {
+                    _logger.LogError(ex, "Graph permissions batch of {Count} items failed", count);
+                }
+            });
+
+        return results;
+    }
+
+    private async Task FetchPermissionsBatchAsync(
+        IReadOnlyList<SharePointFile> files,
+        int offset,
+        int count,
+        FilePermissions?[] results,
+        CancellationToken cancellationToken)
+    {
+        var payload = JsonSerializer.SerializeToUtf8Bytes(new
+        {
+            requests = Enumerable.Range(0, count).Select(i => new
+            {
+                id = i.ToString(CultureInfo.InvariantCulture),
+                method = "GET",
+                url = $"{_drivePath}/items/{files[offset + i].Id}/permissions?$select={PermissionSelect}"
+            })
+        });
+
+        using var document = await SendJsonAsync(HttpMethod.Post, $"{GraphBaseUrl}/$batch", payload, cancellationToken);
+
+        var throttled = new List<int>();
+        foreach (var response in document.RootElement.GetProperty("responses").EnumerateArray())
+        {
+            var index = offset + int.Parse(response.GetProperty("id").GetString()!, CultureInfo.InvariantCulture);
+            var status = response.GetProperty("status").GetInt32();
+            var file = files[index];
 
-            nextUrl = null;
-            if (document.RootElement.TryGetProperty("@odata.nextLink", out var nextLinkNode))
+            if (status is >= 200 and < 300 && response.TryGetProperty("body", out var body))
+            {
+                results[index] = await ReadPermissionsAsync(body, file.Id, file.Path, cancellationToken);
+            }
+            else if (IsTransient((HttpStatusCode)status))
             {
-                nextUrl = nextLinkNode.GetString();
+                throttled.Add(index);
             }
-            else if (document.RootElement.TryGetProperty("@odata.deltaLink", out var deltaLinkNode))
+            else
             {
-                deltaToken = deltaLinkNode.GetString() ?? string.Empty;
+                _logger.LogError("Graph batch permissions request failed for {Path} with status {StatusCode}", file.Path, status);
             }
         }
 
-        return new DeltaResult
+        // Throttled sub-requests go through the single-item path, which honours Retry-After.
+        foreach (var index in throttled)
         {
-            Changes = changes,
-            DeltaToken = deltaToken,
-            IsInitialSync = isInitial
-        };
+            var file = files[index];
+            try
+            {
+                results[index] = await GetFilePermissionsAsync(file.Id, file.Path, cancellationToken);
+            }
+            catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
+            {
+                _logger.LogError(ex, "Failed to fetch permissions for {Path}", file.Path);
+            }
+        }
     }
 
-    public async Task<FilePermissions> GetFilePermissionsAsync(string fileId, string filePath, CancellationToken cancellationToken)
+    private async Task ResolveIdsAsync(SyncOptions options, CancellationToken cancellationToken)
     {
-        EnsureInitialized();
-        var document = await GetJsonAsync($"https://graph.microsoft.com/v1.0/drives/{_driveId}/items/{fileId}/permissions", cancellationToken);
+        var siteUri = options.SharePointSiteUri;
+        
+        // Construire correctement l'URL avec le path relatif sans le slash initial
+        var relativePath = siteUri.AbsolutePath.Trim('/');
+        var sitePath = relativePath.Length == 0 ? $"/sites/{siteUri.Host}" : $"/sites/{siteUri.Host}:/{relativePath}";
+        var drivesPath = relativePath.Length == 0 ? $"{sitePath}/drives" : $"{sitePath}:/drives";
+        
+        _logger.LogInformation("Resolving SharePoint site ID from: {SiteLookup}", $"{GraphBaseUrl}{sitePath}");
+        
+        // The drives are addressed through the same site path, so both lookups share one $batch round trip.
+        var lookups = await GetBatchAsync([$"{sitePath}?$select=id", $"{drivesPath}?$select=id,name"], cancellationToken);
+        var site = lookups[0];
+        var drives = lookups[1];
+        _siteId = site.GetProperty("id").GetString();
 
-        var permissions = new List<SharePointPermission>();
-        if (document.RootElement.TryGetProperty("value", out var values))
+        if (string.IsNullOrWhiteSpace(_siteId))
         {
-            foreach (var perm in values.EnumerateArray())
+            throw new InvalidOperationException($"Unable to resolve site from {options.SharePointSiteUrl}");
+        }
+        
+        _logger.LogInformation("SharePoint Site ID resolved: {SiteId}", _siteId);
+
+        foreach (var drive in drives.GetProperty("value").EnumerateArray())
+        {
+            var driveName = drive.GetProperty("name").GetString();
+            if (string.Equals(driveName, options.SharePointDriveName, StringComparison.OrdinalIgnoreCase))
             {
-                var parsed = ParsePermission(perm);
-                if (parsed is not null)
+                _driveId = drive.GetProperty("id").GetString();
+                break;
+            }
+        }
+
+        if (string.IsNullOrWhiteSpace(_driveId))
+        {
+            // Names are only collected on this failure path; the match above compares without allocating.
+            var available = string.Join(", ", drives.GetProperty("value").EnumerateArray().Select(drive => drive.GetProperty("name").GetString()));
+            throw new InvalidOperationException($"Drive '{options.SharePointDriveName}' not found on site '{options.SharePointSiteUrl}'. Available drives: {available}.");
+        }
+        
+        _logger.LogInformation("SharePoint Drive ID resolved: {DriveId} for drive '{DriveName}'", _driveId, options.SharePointDriveName);
+    }
+
+    private async Task<JsonElement[]> GetBatchAsync(IReadOnlyList<string> urls, CancellationToken cancellationToken)
+    {
+        var payload = JsonSerializer.SerializeToUtf8Bytes(new
+        {
+            requests = urls.Select((url, i) => new
+            {
+                id = i.ToString(CultureInfo.InvariantCulture),
+                method = "GET",
+                url
+            })
+        });
+
+        var results = new JsonElement[urls.Count];
+        var resolved = new bool[urls.Count];
+        using (var document = await SendJsonAsync(HttpMethod.Post, $"{GraphBaseUrl}/$batch", payload, cancellationToken))
+        {
+            foreach (var response in document.RootElement.GetProperty("responses").EnumerateArray())
+            {
+                var index = int.Parse(response.GetProperty("id").GetString()!, CultureInfo.InvariantCulture);
+                if (response.GetProperty("status").GetInt32() is >= 200 and < 300 && response.TryGetProperty("body", out var body))
                 {
-                    permissions.Add(parsed);
+                    results[index] = body.Clone();
+                    resolved[index] = true;
                 }
             }
         }
 
-        return new FilePermissions
+        // Failed sub-requests are repeated on their own, which retries throttling and surfaces hard errors.
+        for (var i = 0; i < urls.Count; i++)
         {
-            FileId = fileId,
-            FilePath = filePath,
-            Permissions = permissions
-        };
+            if (!resolved[i])
+            {
+                using var single = await GetJsonAsync($"{GraphBaseUrl}{urls[i]}", cancellationToken);
+                results[i] = single.RootElement.Clone();
+            }
+        }
+
+        return results;
     }
 
-    private async Task ListChildrenRecursiveAsync(string initialUrl, string parentPath, List<SharePointFile> sink, CancellationToken cancellationToken)
+    private async Task ListChildrenBatchAsync(
+        IReadOnlyList<(string Url, string Path)> folders,
+        int offset,
+        int count,
+        (List<SharePointFile> Files, List<(string Url, string Path)> Folders)[] listings,
+        CancellationToken cancellationToken)
     {
-        var nextUrl = initialUrl;
+        if (count == 1)
+        {
+            await ListChildrenAsync(folders[offset].Url, folders[offset].Path, listings[offset].Files, listings[offset].Folders, cancellationToken);
+            return;
+        }
 
-        while (!string.IsNullOrWhiteSpace(nextUrl))
+        var payload = JsonSerializer.SerializeToUtf8Bytes(new
         {
-            var document = await GetJsonAsync(nextUrl, cancellationToken);
-            if (document.RootElement.TryGetProperty("value", out var values))
+            requests = Enumerable.Range(0, count).Select(i => new
             {
-                foreach (var item in values.EnumerateArray())
-                {
-                    var name = item.GetProperty("name").GetString() ?? string.Empty;
-                    var currentPath = parentPath == "/" ? $"/{name}" : $"{parentPath.TrimEnd('/')}/{name}";
+                id = i.ToString(CultureInfo.InvariantCulture),
+                method = "GET",
+                url = folders[offset + i].Url
+            })
+        });
+
+        using var document = await SendJsonAsync(HttpMethod.Post, $"{GraphBaseUrl}/$batch", payload, cancellationToken);
+
+        // Each folder's remaining pages are walked side by side so one large folder does not hold up
+        // its siblings; every walk fills its own listing slot.
+        var reads = new List<Task>(count);
+        foreach (var response in document.RootElement.GetProperty("responses").EnumerateArray())
+        {
+            var index = offset + int.Parse(response.GetProperty("id").GetString()!, CultureInfo.InvariantCulture);
+            var status = response.GetProperty("status").GetInt32();
 
-                    if (item.TryGetProperty("folder", out _))
-                    {
-                        var folderId = item.GetProperty("id").GetString();
-                        if (!string.IsNullOrWhiteSpace(folderId))
-                        {
-                            await ListChildrenRecursiveAsync(
-                                $"https://graph.microsoft.com/v1.0/drives/{_driveId}/items/{folderId}/children?$top=200",
-                                currentPath,
-                                sink,
-                                cancellationToken);
-                        }
-                    }
-                    else if (item.TryGetProperty("file", out _))
-                    {
-                        sink.Add(new SharePointFile
-                        {
-                            Id = item.GetProperty("id").GetString() ?? string.Empty,
-                            Name = name,
-                            Path = currentPath,
-                            Size = item.TryGetProperty("size", out var sizeNode) ? sizeNode.GetInt64() : 0,
-                            LastModified = item.TryGetProperty("lastModifiedDateTime", out var modifiedNode) &&
-                                           DateTimeOffset.TryParse(modifiedNode.GetString(), out var modified)
-                                ? modified
-                                : null,
-                            ContentHash = item.TryGetProperty("cTag", out var cTagNode)
-                                ? cTagNode.GetString()
-                                : item.TryGetProperty("eTag", out var eTagNode) ? eTagNode.GetString() : null
-                        });
-                    }
-                }
+            if (status is >= 200 and < 300 && response.TryGetProperty("body", out var body))
+            {
+                reads.Add(ReadChildrenAsync(body, folders[index].Path, listings[index].Files, listings[index].Folders, cancellationToken));
+            }
+            else
+            {
+                // A missing folder would make its blobs look orphaned, so a failed sub-request goes through the
+                // single-folder path, which honours Retry-After and throws if the folder still cannot be listed.
+                reads.Add(ListChildrenAsync(folders[index].Url, folders[index].Path, listings[index].Files, listings[index].Folders, cancellationToken));
+            }
+        }
+
+        await Task.WhenAll(reads);
+    }
+
+    private async Task ListChildrenAsync(
+        string url,
+        string parentPath,
+        List<SharePointFile> files,
+        List<(string Url, string Path)> folders,
+        CancellationToken cancellationToken)
+    {
+        using var document = await GetJsonAsync($"{GraphBaseUrl}{url}", cancellationToken);
+        await ReadChildrenAsync(document.RootElement, parentPath, files, folders, cancellationToken);
+    }
+
+    private async Task ReadChildrenAsync(
+        JsonElement firstPage,
+        string parentPath,
+        List<SharePointFile> files,
+        List<(string Url, string Path)> folders,
+        CancellationToken cancellationToken)
+    {
+        // Request the next page before walking this one so its round-trip overlaps the parse.
+        var pageTask = GetNextPage(firstPage, cancellationToken);
+
+        try
+        {
+            AddChildren(firstPage, parentPath, files, folders);
+
+            while (pageTask is not null)
+            {
+                using var document = await pageTask;
+                pageTask = GetNextPage(document.RootElement, cancellationToken);
+                AddChildren(document.RootElement, parentPath, files, folders);
             }
+        }
+        finally
+        {
+            await ReleasePrefetchAsync(pageTask);
+        }
+    }
+
+    private Task<JsonDocument>? GetNextPage(JsonElement page, CancellationToken cancellationToken) =>
+        page.TryGetProperty("@odata.nextLink", out var nextLinkNode) && nextLinkNode.GetString() is { Length: > 0 } nextUrl
+            ? GetJsonAsync(nextUrl, cancellationToken)
+            : null;
+
+    // A page requested ahead of a failure or an abandoned enumeration is still awaited, so its
+    // exception is observed and its pooled document is returned.
+    private static async Task ReleasePrefetchAsync(Task<JsonDocument>? pageTask)
+    {
+        if (pageTask is null)
+        {
+            return;
+        }
 
-            nextUrl = null;
-            if (document.RootElement.TryGetProperty("@odata.nextLink", out var nextLinkNode))
+        try
+        {
+            (await pageTask).Dispose();
+        }
+        catch
+        {
+        }
+    }
+
+    private void AddChildren(JsonElement page, string parentPath, List<SharePointFile> files, List<(string Url, string Path)> folders)
+    {
+        if (!page.TryGetProperty("value", out var values))
+        {
+            return;
+        }
+
+        // Trimmed once per page rather than per item; the root trims to empty and still yields "/{name}".
+        var pathPrefix = parentPath.TrimEnd('/');
+        foreach (var item in values.EnumerateArray())
+        {
+            var name = item.GetProperty("name").GetString() ?? string.Empty;
+            var currentPath = string.Concat(pathPrefix, "/", name);
+
+            if (item.TryGetProperty("folder", out _))
+            {
+                var folderId = item.GetProperty("id").GetString();
+                if (!string.IsNullOrWhiteSpace(folderId))
+                {
+                    folders.Add(($"{_drivePath}/items/{folderId}/children{ChildrenQuery}", currentPath));
+                }
+            }
+            else if (item.TryGetProperty("file", out _))
             {
-                nextUrl = nextLinkNode.GetString();
+                files.Add(new SharePointFile
+                {
+                    Id = item.GetProperty("id").GetString() ?? string.Empty,
+                    Name = name,
+                    Path = currentPath,
+                    Size = item.TryGetProperty("size", out var sizeNode) ? sizeNode.GetInt64() : 0,
+                    LastModified = GetLastModified(item),
+                    ContentHash = item.TryGetProperty("cTag", out var cTagNode)
+                        ? cTagNode.GetString()
+                        : item.TryGetProperty("eTag", out var eTagNode) ? eTagNode.GetString() : null,
+                    DownloadUrl = item.TryGetProperty("@microsoft.graph.downloadUrl", out var downloadUrlNode) ? downloadUrlNode.GetString() : null
+                });
             }
         }
     }
 
-    private static DeltaChange? ParseDeltaItem(JsonElement item)
+    private DeltaChange? ParseDeltaItem(JsonElement item)
     {
         var itemId = item.TryGetProperty("id", out var idNode) ? idNode.GetString() ?? string.Empty : string.Empty;
         var itemName = item.TryGetProperty("name", out var nameNode) ? nameNode.GetString() ?? string.Empty : string.Empty;
@@ -238,9 +609,15 @@ public sealed class SharePointGraphClient
         var itemPath = string.Empty;
         if (item.TryGetProperty("parentReference", out var parentReference) && parentReference.TryGetProperty("path", out var pathNode))
         {
-            var parentPathRaw = pathNode.GetString() ?? string.Empty;
-            var parentPath = parentPathRaw.Contains(':') ? parentPathRaw[(parentPathRaw.IndexOf(':') + 1)..] : string.Empty;
-            itemPath = string.IsNullOrEmpty(parentPath) ? $"/{itemName}" : $"{parentPath.TrimEnd('/')}/{itemName}";
+            // Sliced as a span so the parent path is only materialized once, inside the final item path.
+            // Items of this drive share the "/drives/{id}/root:" prefix, so it is stripped by length
+            // and the colon search is only a fallback.
+            var parentPathRaw = (pathNode.GetString() ?? string.Empty).AsSpan();
+            var prefixLength = parentPathRaw.StartsWith(_rootPathPrefix, StringComparison.Ordinal)
+                ? _rootPathPrefix!.Length
+                : parentPathRaw.IndexOf(':') + 1;
+            var parentPath = prefixLength > 0 ? parentPathRaw[prefixLength..].TrimEnd('/') : ReadOnlySpan<char>.Empty;
+            itemPath = string.Concat(parentPath, "/", itemName);
         }
 
         if (item.TryGetProperty("deleted", out _))
@@ -272,12 +649,6 @@ public sealed class SharePointGraphClient
             return null;
         }
 
-        DateTimeOffset? modified = null;
-        if (item.TryGetProperty("lastModifiedDateTime", out var modifiedNode) && DateTimeOffset.TryParse(modifiedNode.GetString(), out var parsed))
-        {
-            modified = parsed;
-        }
-
         return new DeltaChange
         {
             ChangeType = DeltaChangeType.CreatedOrModified,
@@ -291,14 +662,73 @@ public sealed class SharePointGraphClient
                 Name = itemName,
                 Path = itemPath,
                 Size = item.TryGetProperty("size", out var sizeNode) ? sizeNode.GetInt64() : 0,
-                LastModified = modified,
+                LastModified = GetLastModified(item),
                 ContentHash = item.TryGetProperty("cTag", out var cTagNode)
                     ? cTagNode.GetString()
-                    : item.TryGetProperty("eTag", out var eTagNode) ? eTagNode.GetString() : null
+                    : item.TryGetProperty("eTag", out var eTagNode) ? eTagNode.GetString() : null,
+                DownloadUrl = item.TryGetProperty("@microsoft.graph.downloadUrl", out var downloadUrlNode) ? downloadUrlNode.GetString() : null
+            }
+        };
+    }
+
+    private static DateTimeOffset? GetLastModified(JsonElement item)
+    {
+        // Graph always emits ISO 8601, so read it straight from the UTF-8 token instead of
+        // materializing a string for the culture-aware general parser.
+        return item.TryGetProperty("lastModifiedDateTime", out var modifiedNode) &&
+               modifiedNode.ValueKind == JsonValueKind.String &&
+               modifiedNode.TryGetDateTimeOffset(out var modified)
+            ? modified
+            : null;
+    }
+
+    private async Task<FilePermissions> ReadPermissionsAsync(JsonElement firstPage, string fileId, string filePath, CancellationToken cancellationToken)
+    {
+        var permissions = new List<SharePointPermission>();
+
+        // Heavily shared items page their grants; the next page is requested before this one is parsed,
+        // and each page is released in turn.
+        var pageTask = GetNextPage(firstPage, cancellationToken);
+
+        try
+        {
+            AddPermissions(firstPage, permissions);
+
+            while (pageTask is not null)
+            {
+                using var document = await pageTask;
+                pageTask = GetNextPage(document.RootElement, cancellationToken);
+                AddPermissions(document.RootElement, permissions);
             }
+        }
+        finally
+        {
+            await ReleasePrefetchAsync(pageTask);
+        }
+
+        return new FilePermissions
+        {
+            FileId = fileId,
+            FilePath = filePath,
+            Permissions = permissions
         };
     }
 
+    private static void AddPermissions(JsonElement page, List<SharePointPermission> sink)
+    {
+        if (page.TryGetProperty("value", out var values))
+        {
+            foreach (var perm in values.EnumerateArray())
+            {
+                var parsed = ParsePermission(perm);
+                if (parsed is not null)
+                {
+                    sink.Add(parsed);
+                }
+            }
+        }
+    }
+
     private static SharePointPermission? ParsePermission(JsonElement permission)
     {
         var permissionId = permission.TryGetProperty("id", out var idNode) ? idNode.GetString() ?? string.Empty : string.Empty;
@@ -311,32 +741,28 @@ public sealed class SharePointGraphClient
 
         if (permission.TryGetProperty("grantedToV2", out var grantedToV2))
         {
-            if (grantedToV2.TryGetProperty("user", out var user))
-            {
-                identityType = "user";
-                displayName = user.TryGetProperty("displayName", out var dn) ? dn.GetString() ?? string.Empty : string.Empty;
-                email = user.TryGetProperty("email", out var em) ? em.GetString() : null;
-                identityId = user.TryGetProperty("id", out var uid) ? uid.GetString() : null;
-            }
-            else if (grantedToV2.TryGetProperty("group", out var group))
-            {
-                identityType = "group";
-                displayName = group.TryGetProperty("displayName", out var dn) ? dn.GetString() ?? string.Empty : string.Empty;
-                email = group.TryGetProperty("email", out var em) ? em.GetString() : null;
-                identityId = group.TryGetProperty("id", out var gid) ? gid.GetString() : null;
-            }
-            else if (grantedToV2.TryGetProperty("siteGroup", out var siteGroup))
-            {
-                identityType = "siteGroup";
-                displayName = siteGroup.TryGetProperty("displayName", out var dn) ? dn.GetString() ?? string.Empty : string.Empty;
-                identityId = siteGroup.TryGetProperty("id", out var sgid) ? sgid.GetRawText() : null;
-            }
-            else if (grantedToV2.TryGetProperty("siteUser", out var siteUser))
+            foreach (var (facet, facetIdentityType) in IdentityFacets)
             {
-                identityType = "user";
-                displayName = siteUser.TryGetProperty("displayName", out var dn) ? dn.GetString() ?? string.Empty : string.Empty;
-                email = siteUser.TryGetProperty("email", out var em) ? em.GetString() : null;
-                identityId = siteUser.TryGetProperty("id", out var suid) ? suid.GetString() : null;
+                if (!grantedToV2.TryGetProperty(facet, out var identity))
+                {
+                    continue;
+                }
+
+                identityType = facetIdentityType;
+                displayName = identity.TryGetProperty("displayName", out var dn) ? dn.GetString() ?? string.Empty : string.Empty;
+
+                if (facet == "siteGroup")
+                {
+                    // Site groups have no email and a numeric id.
+                    identityId = identity.TryGetProperty("id", out var sgid) ? sgid.GetRawText() : null;
+                }
+                else
+                {
+                    email = identity.TryGetProperty("email", out var em) ? em.GetString() : null;
+                    identityId = identity.TryGetProperty("id", out var id) ? id.GetString() : null;
+                }
+
+                break;
             }
         }
 
@@ -362,6 +788,15 @@ public sealed class SharePointGraphClient
         };
     }
 
+    // The next run resolves the site and drive again instead of reusing IDs that may be stale.
+    private void ForgetResolvedIds()
+    {
+        if (_resolvedIdsKey is { } key)
+        {
+            ResolvedIds.TryRemove(key, out _);
+        }
+    }
+
     private void EnsureInitialized()
     {
         if (string.IsNullOrWhiteSpace(_siteId) || string.IsNullOrWhiteSpace(_driveId))
@@ -374,11 +809,13 @@ public sealed class SharePointGraphClient
     {
         try
         {
-            _logger.LogDebug("Requesting token for scopes: {Scopes}", string.Join(", ", _scopes));
-            var token = await _credential.GetTokenAsync(new TokenRequestContext(_scopes), cancellationToken);
-            _logger.LogDebug("Token acquired successfully, expires at {ExpiresOn}", token.ExpiresOn);
+            var token = await GetAccessTokenAsync(cancellationToken);
 
-            var request = new HttpRequestMessage(method, url);
+            var request = new HttpRequestMessage(method, url)
+            {
+                Version = HttpVersion.Version20,
+                VersionPolicy = HttpVersionPolicy.RequestVersionOrLower
+            };
             request.Headers.Authorization = new AuthenticationHeaderValue("Bearer", token.Token);
             request.Headers.Accept.Add(new MediaTypeWithQualityHeaderValue("application/json"));
             return request;
@@ -390,18 +827,55 @@ public sealed class SharePointGraphClient
         }
     }
 
-    private async Task<JsonDocument> GetJsonAsync(string url, CancellationToken cancellationToken)
+    private Task<AccessToken> GetAccessTokenAsync(CancellationToken cancellationToken)
+    {
+        // Every request of a run shares one token (and concurrent callers share one fetch); it is
+        // refreshed a few minutes before expiry or after a failed acquisition.
+        var tokenTask = _tokenTask;
+        if (tokenTask is null ||
+            tokenTask.IsFaulted ||
+            tokenTask.IsCanceled ||
+            (tokenTask.IsCompletedSuccessfully && tokenTask.Result.ExpiresOn <= DateTimeOffset.UtcNow + TokenRefreshMargin))
+        {
+            tokenTask = _tokenTask = RequestTokenAsync(cancellationToken);
+        }
+
+        return tokenTask;
+    }
+
+    private async Task<AccessToken> RequestTokenAsync(CancellationToken cancellationToken)
     {
-        using var request = await CreateRequestAsync(HttpMethod.Get, url, cancellationToken);
-        using var client = _httpClientFactory.CreateClient();
+        // The scope list is only joined when debug logging is actually on.
+        if (_logger.IsEnabled(LogLevel.Debug))
+        {
+            _logger.LogDebug("Requesting token for scopes: {Scopes}", string.Join(", ", _scopes));
+        }
 
-        _logger.LogDebug("Sending request to: {Url}", url);
-        using var response = await client.SendAsync(request, cancellationToken);
+        var token = await _credential.GetTokenAsync(new TokenRequestContext(_scopes), cancellationToken);
+        _logger.LogDebug("Token acquired successfully, expires at {ExpiresOn}", token.ExpiresOn);
+        return token;
+    }
+
+    private Task<JsonDocument> GetJsonAsync(string url, CancellationToken cancellationToken) =>
+        SendJsonAsync(HttpMethod.Get, url, null, cancellationToken);
+
+    private async Task<JsonDocument> SendJsonAsync(HttpMethod method, string url, byte[]? content, CancellationToken cancellationToken)
+    {
+        // The document is parsed straight off the connection rather than from a fully buffered copy,
+        // which matters for multi-megabyte delta and $batch pages.
+        using var response = await SendWithRetryAsync(method, url, content, HttpCompletionOption.ResponseHeadersRead, cancellationToken);
 
         if (!response.IsSuccessStatusCode)
         {
             var errorContent = await response.Content.ReadAsStringAsync(cancellationToken);
             _logger.LogError("Graph API request failed. Status: {StatusCode}, Response: {Response}", response.StatusCode, errorContent);
+
+            if (response.StatusCode == HttpStatusCode.NotFound &&
+                _drivePath is not null &&
+                url.Contains(_drivePath, StringComparison.Ordinal))
+            {
+                ForgetResolvedIds();
+            }
         }
 
         response.EnsureSuccessStatusCode();
@@ -409,4 +883,64 @@ public sealed class SharePointGraphClient
         await using var stream = await response.Content.ReadAsStreamAsync(cancellationToken);
         return await JsonDocument.ParseAsync(stream, default, cancellationToken);
     }
+
+    private async Task<HttpResponseMessage> SendWithRetryAsync(
+        HttpMethod method,
+        string url,
+        byte[]? content,
+        HttpCompletionOption completionOption,
+        CancellationToken cancellationToken)
+    {
+        for (var attempt = 1; ; attempt++)
+        {
+            using var request = await CreateRequestAsync(method, url, cancellationToken);
+            if (content is not null)
+            {
+                request.Content = new ByteArrayContent(content);
+                request.Content.Headers.ContentType = new MediaTypeHeaderValue("application/json");
+            }
+
+            _logger.LogDebug("Sending request to: {Url}", url);
+            var response = await _httpClient.SendAsync(request, completionOption, cancellationToken);
+
+            if (attempt == MaxAttempts || !IsTransient(response.StatusCode))
+            {
+                return response;
+            }
+
+            var delay = GetRetryDelay(response, attempt);
+            response.Dispose();
+
+            _logger.LogWarning(
+                "Graph request throttled with {StatusCode}, retrying in {DelayMs} ms (attempt {Attempt}/{MaxAttempts})",
+                (int)response.StatusCode,
+                (int)delay.TotalMilliseconds,
+                attempt,
+                MaxAttempts);
+            await Task.Delay(delay, cancellationToken);
+        }
+    }
+
+    private static bool IsTransient(HttpStatusCode statusCode) =>
+        statusCode is HttpStatusCode.TooManyRequests or HttpStatusCode.ServiceUnavailable or HttpStatusCode.GatewayTimeout;
+
+    private static TimeSpan GetRetryDelay(HttpResponseMessage response, int attempt)
+    {
+        // Graph sends Retry-After on throttled responses and is honoured as given; retrying sooner
+        // only earns another 429. The cap applies to the computed backoff alone.
+        var retryAfter = response.Headers.RetryAfter;
+        if (retryAfter?.Delta is { } delta)
+        {
+            return delta < TimeSpan.Zero ? TimeSpan.Zero : delta;
+        }
+
+        if (retryAfter?.Date is { } date)
+        {
+            var untilDate = date - DateTimeOffset.UtcNow;
+            return untilDate < TimeSpan.Zero ? TimeSpan.Zero : untilDate;
+        }
+
+        var backoff = BaseRetryDelay * Math.Pow(2, attempt - 1) + BaseRetryDelay * Random.Shared.NextDouble();
+        return backoff > MaxRetryDelay ? MaxRetryDelay : backoff;
+    }
 }
@@ -1,3 +1,4 @@
+using System.Collections.Concurrent;
 using Azure.Core;
 using Microsoft.Extensions.Logging;
 using SharePointSync.Functions.Models;
@@ -29,30 +30,28 @@ public sealed class SharePointSyncOrchestrator
 
         var (_, driveId) = _graphClient.GetResolvedIds();
 
-        await RunFullAsync(options, stats, logger, cancellationToken);
-
-        if (options.SyncPermissions)
+        if (options.RunsContentPhase)
         {
-            var allFiles = await _graphClient.ListFilesAsync(options.SharePointFolderPath, cancellationToken);
-            foreach (var file in allFiles)
+            var (allFiles, storedPermissions, uploaded, uploadedWithPermissions) = await RunFullAsync(options, stats, logger, cancellationToken);
+            if (options.RunsPermissionsPhase)
             {
-                try
-                {
-                    var permissions = await _graphClient.GetFilePermissionsAsync(file.Id, file.Path, cancellationToken);
-                    var blobName = _blobClient.GetBlobName(file.Path);
-                    await _blobClient.UpdateBlobMetadataAsync(blobName, permissions.ToMetadata(), cancellationToken);
-                    stats.PermissionsSynced++;
-                }
-                catch (Exception ex)
-                {
-                    logger.LogError(ex, "Failed to sync permissions for {Path}", file.Path);
-                    stats.PermissionsFailed++;
-                }
+                await SyncPermissionsAsync(options, allFiles, storedPermissions, uploaded, uploadedWithPermissions, stats, cancellationToken);
             }
         }
+        else
+        {
+            stats.SyncMode = "permissions";
+
+            var existingBlobs = await _blobClient.ListBlobsAsync(cancellationToken);
+            var files = await _graphClient.ListFilesAsync(options.SharePointFolderPath, cancellationToken);
+            var entries = files.Select(file => (file, _blobClient.GetBlobName(file.Path))).ToArray();
+
+            var none = new HashSet<string>();
+            await SyncPermissionsAsync(options, entries, GetStoredPermissionState(existingBlobs), none, none, stats, cancellationToken);
+        }
 
         logger.LogInformation(
-            "Sync complete mode={Mode}, scanned={Scanned}, skippedTooLarge={SkippedTooLarge}, added={Added}, updated={Updated}, deleted={Deleted}, unchanged={Unchanged}, failed={Failed}, bytes={Bytes}, permissionsSynced={PermSynced}, permissionsFailed={PermFailed}",
+            "Sync complete mode={Mode}, scanned={Scanned}, skippedTooLarge={SkippedTooLarge}, added={Added}, updated={Updated}, deleted={Deleted}, unchanged={Unchanged}, failed={Failed}, bytes={Bytes}, permissionsSynced={PermSynced}, permissionsFailed={PermFailed}, permissionsSkipped={PermSkipped}",
             stats.SyncMode,
             stats.FilesScanned,
             stats.FilesSkippedTooLarge,
@@ -63,12 +62,13 @@ public sealed class SharePointSyncOrchestrator
             stats.FilesFailed,
             stats.BytesTransferred,
             stats.PermissionsSynced,
-            stats.PermissionsFailed);
+            stats.PermissionsFailed,
+            stats.PermissionsSkipped);
 
         return stats;
     }
 
-    private async Task RunFullAsync(
+    private async Task<(IReadOnlyList<(SharePointFile File, string BlobName)> Files, IReadOnlyDictionary<string, string> StoredPermissions, IReadOnlySet<string> Uploaded, IReadOnlySet<string> UploadedWithPermissions)> RunFullAsync(
         SyncOptions options,
         SyncStats stats,
         ILogger logger,
@@ -77,11 +77,18 @@ public sealed class SharePointSyncOrchestrator
         stats.SyncMode = "full";
 
         var existingBlobs = await _blobClient.ListBlobsAsync(cancellationToken);
-        var seenBlobNames = new HashSet<string>(StringComparer.OrdinalIgnoreCase);
+        // Only the orphan sweep needs the seen set; DELETE_ORPHANED_BLOBS is off by default.
+        var seenBlobNames = options.DeleteOrphanedBlobs ? new HashSet<string>(StringComparer.OrdinalIgnoreCase) : null;
         var files = await _graphClient.ListFilesAsync(options.SharePointFolderPath, cancellationToken);
 
-        foreach (var file in files)
+        // Blob names are derived once per file and shared with the permissions pass.
+        var entries = new (SharePointFile File, string BlobName)[files.Count];
+        var pending = new List<(SharePointFile File, string BlobName)>(files.Count);
+        for (var i = 0; i < files.Count; i++)
         {
+            var file = files[i];
+            var blobName = _blobClient.GetBlobName(file.Path);
+            entries[i] = (file, blobName);
             stats.FilesScanned++;
 
             if (file.Size > options.MaxFileSizeBytes)
@@ -95,57 +102,228 @@ public sealed class SharePointSyncOrchestrator
                 continue;
             }
 
-            var blobName = _blobClient.GetBlobName(file.Path);
-            seenBlobNames.Add(blobName);
+            seenBlobNames?.Add(blobName);
+            pending.Add((file, blobName));
+        }
+
+        var parallelOptions = new ParallelOptions
+        {
+            MaxDegreeOfParallelism = options.MaxConcurrency,
+            CancellationToken = cancellationToken
+        };
+
+        // Workers tally into locals with Interlocked and the totals are folded into stats once.
+        var added = 0;
+        var updated = 0;
+        var unchanged = 0;
+        var failed = 0;
+        var bytesTransferred = 0L;
+        var uploadedBag = new ConcurrentBag<string>();
+        var uploadedWithPermissionsBag = new ConcurrentBag<string>();
+
+        await Parallel.ForEachAsync(pending, parallelOptions, async (item, ct) =>
+        {
+            var (file, blobName) = item;
 
             try
             {
+                bool withPermissions;
                 if (!existingBlobs.TryGetValue(blobName, out var existingBlob))
                 {
-                    var content = await _graphClient.DownloadFileAsync(file.Id, cancellationToken);
-                    await _blobClient.UploadBlobAsync(file.Path, content, file.Id, file.LastModified, file.ContentHash, cancellationToken);
-                    stats.FilesAdded++;
-                    stats.BytesTransferred += content.LongLength;
+                    withPermissions = await UploadFileAsync(file, options.RunsPermissionsPhase, null, logger, ct);
+                    Interlocked.Increment(ref added);
                 }
                 else if (_blobClient.ShouldUpdate(existingBlob, file.LastModified, file.ContentHash))
                 {
-                    var content = await _graphClient.DownloadFileAsync(file.Id, cancellationToken);
-                    await _blobClient.UploadBlobAsync(file.Path, content, file.Id, file.LastModified, file.ContentHash, cancellationToken);
-                    stats.FilesUpdated++;
-                    stats.BytesTransferred += content.LongLength;
+                    // Put Blob replaces all metadata, so a content-only upload carries the stored ACL over
+                    // until the next permissions pass refreshes it.
+                    var retainedMetadata = options.RunsPermissionsPhase ? null : GetRetainedPermissionMetadata(existingBlob);
+                    withPermissions = await UploadFileAsync(file, options.RunsPermissionsPhase, retainedMetadata, logger, ct);
+                    Interlocked.Increment(ref updated);
                 }
                 else
                 {
-                    stats.FilesUnchanged++;
+                    Interlocked.Increment(ref unchanged);
+                    return;
+                }
+
+                Interlocked.Add(ref bytesTransferred, file.Size);
+                uploadedBag.Add(blobName);
+                if (withPermissions)
+                {
+                    uploadedWithPermissionsBag.Add(blobName);
                 }
             }
-            catch (Exception ex)
+            catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
             {
                 logger.LogError(ex, "Failed to process file {Path}", file.Path);
-                stats.FilesFailed++;
+                Interlocked.Increment(ref failed);
+            }
+        });
+
+        var uploaded = new HashSet<string>(uploadedBag, StringComparer.OrdinalIgnoreCase);
+        var uploadedWithPermissions = new HashSet<string>(uploadedWithPermissionsBag, StringComparer.OrdinalIgnoreCase);
+        stats.FilesAdded += added;
+        stats.FilesUpdated += updated;
+        stats.FilesUnchanged += unchanged;
+        stats.FilesFailed += failed;
+        stats.BytesTransferred += bytesTransferred;
+        stats.PermissionsSynced += uploadedWithPermissions.Count;
+
+        if (seenBlobNames is not null)
+        {
+            var orphans = existingBlobs.Keys.Where(blobName => !seenBlobNames.Contains(blobName)).ToList();
+            if (orphans.Count > 0)
+            {
+                var deleteFailed = await _blobClient.DeleteBlobsAsync(orphans, cancellationToken);
+                stats.FilesDeleted += orphans.Count - deleteFailed;
+                stats.FilesFailed += deleteFailed;
+            }
+        }
+
+        // Only the stored ACL hashes outlive the full sync, so the listing snapshot with every blob's
+        // metadata can be collected before the permissions pass starts.
+        var storedPermissions = options.RunsPermissionsPhase
+            ? GetStoredPermissionState(existingBlobs)
+            : new Dictionary<string, string>();
+
+        return (entries, storedPermissions, uploaded, uploadedWithPermissions);
+    }
+
+    private async Task SyncPermissionsAsync(
+        SyncOptions options,
+        IReadOnlyList<(SharePointFile File, string BlobName)> files,
+        IReadOnlyDictionary<string, string> storedPermissions,
+        IReadOnlySet<string> uploaded,
+        IReadOnlySet<string> uploadedWithPermissions,
+        SyncStats stats,
+        CancellationToken cancellationToken)
+    {
+        var candidates = new List<(SharePointFile File, string BlobName)>(files.Count);
+        foreach (var (file, blobName) in files)
+        {
+            if (uploadedWithPermissions.Contains(blobName))
+            {
+                continue;
             }
+
+            candidates.Add((file, blobName));
         }
 
-        if (options.DeleteOrphanedBlobs)
+        // Failures are logged per file by the Graph client and come back as null.
+        var results = await _graphClient.GetFilePermissionsBatchAsync(candidates.Select(c => c.File).ToArray(), cancellationToken);
+        var metadataUpdates = new List<KeyValuePair<string, IDictionary<string, string>>>(candidates.Count);
+        // One timestamp for the whole pass instead of formatting the clock for every file.
+        var syncedAt = DateTimeOffset.UtcNow.ToString("O");
+        for (var i = 0; i < candidates.Count; i++)
         {
-            foreach (var blobName in existingBlobs.Keys)
+            var (file, blobName) = candidates[i];
+            if (results[i] is not { } permissions)
             {
-                if (seenBlobNames.Contains(blobName))
-                {
-                    continue;
-                }
+                stats.PermissionsFailed++;
+                continue;
+            }
 
+            var metadata = permissions.ToMetadata(syncedAt);
+
+            // Sharing changes do not move the item eTag, so permissions are fetched for every item and
+            // only the blob write is skipped when the ACL hash matches what is stored. The stored hash
+            // predates this run, so it says nothing about blobs re-uploaded since: Put Blob replaced
+            // their metadata and dropped the ACL keys.
+            if (!uploaded.Contains(blobName) &&
+                storedPermissions.TryGetValue(blobName, out var storedHash) &&
+                string.Equals(storedHash, metadata[FilePermissions.MetadataPermissionsHash], StringComparison.Ordinal))
+            {
+                stats.PermissionsSkipped++;
+                continue;
+            }
+
+            metadataUpdates.Add(new(blobName, metadata));
+        }
+
+        var metadataFailed = await _blobClient.UpdateBlobMetadataBulkAsync(metadataUpdates, options.MaxConcurrency, cancellationToken);
+        stats.PermissionsSynced += metadataUpdates.Count - metadataFailed;
+        stats.PermissionsFailed += metadataFailed;
+    }
+
+    private async Task<bool> UploadFileAsync(
+        SharePointFile file,
+        bool includePermissions,
+        IDictionary<string, string>? retainedMetadata,
+        ILogger logger,
+        CancellationToken cancellationToken)
+    {
+        // Fetched alongside the download so the upload carries the ACL metadata and the
+        // permissions pass has nothing left to write for this file.
+        var permissionsTask = includePermissions
+            ? _graphClient.GetFilePermissionsAsync(file.Id, file.Path, cancellationToken)
+            : null;
+
+        Stream content;
+        try
+        {
+            content = await _graphClient.OpenFileStreamAsync(file, cancellationToken);
+        }
+        catch when (permissionsTask is not null)
+        {
+            // The file fails either way; observe the fetch so its outcome is not left dangling.
+            try
+            {
+                await permissionsTask;
+            }
+            catch
+            {
+            }
+
+            throw;
+        }
+
+        await using (content)
+        {
+            IDictionary<string, string>? permissionMetadata = null;
+            if (permissionsTask is not null)
+            {
                 try
                 {
-                    await _blobClient.DeleteBlobAsync(blobName, cancellationToken);
-                    stats.FilesDeleted++;
+                    permissionMetadata = (await permissionsTask).ToMetadata();
                 }
-                catch (Exception ex)
+                catch (Exception ex) when (!cancellationToken.IsCancellationRequested)
                 {
-                    logger.LogError(ex, "Failed to delete orphan blob {Blob}", blobName);
-                    stats.FilesFailed++;
+                    logger.LogWarning(ex, "Failed to fetch permissions for {Path} during upload, leaving them to the permissions pass", file.Path);
                 }
             }
+
+            await _blobClient.UploadBlobAsync(file.Path, content, file.Id, file.LastModified, file.ContentHash, permissionMetadata ?? retainedMetadata, cancellationToken);
+            return permissionMetadata is not null;
         }
     }
+
+    private static IDictionary<string, string>? GetRetainedPermissionMetadata(BlobFile existingBlob)
+    {
+        Dictionary<string, string>? retained = null;
+        foreach (var key in FilePermissions.MetadataKeys)
+        {
+            if (existingBlob.Metadata.TryGetValue(key, out var value))
+            {
+                retained ??= new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase);
+                retained[key] = value;
+            }
+        }
+
+        return retained;
+    }
+
+    private static Dictionary<string, string> GetStoredPermissionState(IReadOnlyDictionary<string, BlobFile> existingBlobs)
+    {
+        var storedPermissions = new Dictionary<string, string>(StringComparer.OrdinalIgnoreCase);
+        foreach (var (blobName, blob) in existingBlobs)
+        {
+            if (blob.Metadata.TryGetValue(FilePermissions.MetadataPermissionsHash, out var storedHash))
+            {
+                storedPermissions[blobName] = storedHash;
+            }
+        }
+
+        return storedPermissions;
+    }
 }
@@ -1,7 +1,15 @@
+using System.Collections.Frozen;
+
 namespace SharePointSync.Functions.Services;
 
 public sealed class SyncOptions
 {
+    private static readonly FrozenSet<string> TrueValues =
+        new[] { "true", "1", "yes", "y", "on" }.ToFrozenSet(StringComparer.OrdinalIgnoreCase);
+
+    private string? _blobAccountUrl;
+    private Uri? _sharePointSiteUri;
+
     public required string SharePointSiteUrl { get; init; }
     public required string SharePointDriveName { get; init; }
     public required string SharePointFolderPath { get; init; }
@@ -11,9 +19,14 @@ public sealed class SyncOptions
     public int MaxFileSizeMb { get; init; }
     public bool DeleteOrphanedBlobs { get; init; }
     public bool SyncPermissions { get; init; }
+    public int MaxConcurrency { get; init; }
+    public string SyncPhase { get; init; } = "all";
 
-    public string BlobAccountUrl => $"https://{StorageAccountName}.blob.core.windows.net";
+    public string BlobAccountUrl => _blobAccountUrl ??= $"https://{StorageAccountName}.blob.core.windows.net";
+    public Uri SharePointSiteUri => _sharePointSiteUri ??= new Uri(SharePointSiteUrl);
     public long MaxFileSizeBytes => (long)MaxFileSizeMb * 1024 * 1024;
+    public bool RunsContentPhase => SyncPhase != "permissions";
+    public bool RunsPermissionsPhase => SyncPermissions && SyncPhase != "content";
 
     public static SyncOptions FromEnvironment()
     {
@@ -27,7 +40,9 @@ public sealed class SyncOptions
             BlobPrefix = Get("AZURE_BLOB_PREFIX"),
             MaxFileSizeMb = GetInt("MAX_FILE_SIZE_MB", 50),
             DeleteOrphanedBlobs = GetBool("DELETE_ORPHANED_BLOBS"),
-            SyncPermissions = GetBool("SYNC_PERMISSIONS")
+            SyncPermissions = GetBool("SYNC_PERMISSIONS"),
+            MaxConcurrency = GetInt("SYNC_CONCURRENCY", 8),
+            SyncPhase = Get("SYNC_PHASE", "all").Trim().ToLowerInvariant()
         };
     }
 
@@ -54,6 +69,20 @@ public sealed class SyncOptions
             errors.Add("MAX_FILE_SIZE_MB must be greater than 0.");
         }
 
+        if (MaxConcurrency <= 0)
+        {
+            errors.Add("SYNC_CONCURRENCY must be greater than 0.");
+        }
+
+        if (SyncPhase is not ("all" or "content" or "permissions"))
+        {
+            errors.Add("SYNC_PHASE must be one of: all, content, permissions.");
+        }
+        else if (SyncPhase == "permissions" && !SyncPermissions)
+        {
+            errors.Add("SYNC_PHASE=permissions requires SYNC_PERMISSIONS=true.");
+        }
+
         if (errors.Count > 0)
         {
             throw new InvalidOperationException(string.Join(" ", errors));
@@ -69,7 +98,7 @@ public sealed class SyncOptions
     private static bool GetBool(string key)
     {
         var value = Environment.GetEnvironmentVariable(key);
-        return string.Equals(value, "true", StringComparison.OrdinalIgnoreCase);
+        return value is not null && TrueValues.Contains(value.Trim());
     }
 
     private static int GetInt(string key, int defaultValue)